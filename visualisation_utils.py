@@ -1,188 +1,566 @@
 """Set of functions for visualisations."""
+import io
+import queue
+import threading
+from functools import lru_cache
 import numpy as np
 import torch
 import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-from time import gmtime, strftime
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+from numba import njit, prange
+
+# Class colours and names of the supported datasets
+_COLOR_LISTS = {
+    'pavia_centre': ('white', 'blue', 'green', 'olive', 'red',
+                     'yellow', 'grey', 'cyan', 'orange', 'black'),
+    'krkonose': ('white', 'red', 'green', 'yellow', 'orange', 'pink',
+                 'blue', 'cyan', 'black', 'grey'),
+}
+_CLASS_NAMES = {
+    'pavia_centre': ('No Data', 'Water', 'Trees', 'Meadows',
+                     'Self-Blocking Bricks', 'Bare Soil', 'Asphalt',
+                     'Bitumen', 'Tiles', 'Shadows'),
+    'krkonose': ('No Data', 'metlička křivolaká',
+                 'metlička, tomka a ostřice',
+                 'brusnice borůvková', 'metlice trsnatá',
+                 'borovice kleč', 'smilka tuhá', 'kamenná moře bez vegetace',
+                 'vřes obecný', 'kameny, půda, mechy a vegetace'),
+}
+
+# Class colours parsed once into RGBA arrays
+_RGBA = {ds_name: to_rgba_array(colors).astype(np.float32)
+         for ds_name, colors in _COLOR_LISTS.items()}
+
+# RGBA colour of each class name, by dataset
+CLASS_COLORS = {ds_name: dict(zip(_CLASS_NAMES[ds_name], rgba))
+                for ds_name, rgba in _RGBA.items()}
+
+# 8-bit lookup tables of the class colours
+_LUTS = {ds_name: np.round(rgba * 255).astype(np.uint8)
+         for ds_name, rgba in _RGBA.items()}
+
+# Legend entries of the classes, shared by all figures
+_LEGEND_HANDLES = {
+    ds_name: [Patch(facecolor=tuple(color), edgecolor='black', label=label)
+              for label, color in zip(_CLASS_NAMES[ds_name], rgba)]
+    for ds_name, rgba in _RGBA.items()}
+
+# Figures kept open for reuse, keyed by their layout
+_FIGURES = {}
+
+# Buffers of the RGB composites, keyed by their shape
+_COMPOSITE_BUFFERS = {}
+
+# Comparisons waiting to be rendered and the rendered PNG images
+_RENDER_QUEUE = queue.Queue()
+_RENDERED = queue.Queue()
+_RENDER_THREAD = None
+
+# Numba's workqueue threading layer does not allow concurrent parallel calls
+_NUMBA_LOCK = threading.Lock()
+
+
+@njit(cache=True)
+def _min_max(values):
+    """Return the minimum and maximum of the values in a single pass."""
+    if values.size == 0:
+        return np.int64(0), np.int64(0)
+    low = high = values[0]
+    for value in values:
+        low = min(low, value)
+        high = max(high, value)
+    return np.int64(low), np.int64(high)
+
+
+def _squeeze_classes(raster):
+    """Drop the trailing band axis of a (height, width, 1) class raster."""
+    if raster.ndim == 3 and raster.shape[-1] == 1:
+        return raster[..., 0]
+    return raster
+
+
+def _class_range(arr=None):
+    """Return the slice of class indices present in the raster."""
+    if arr is None:
+        return slice(None)
+
+    arr = _squeeze_classes(arr)
+    arr_min, arr_max = _min_max(np.ravel(arr))
+    if arr_min == arr_max == 0:
+        return slice(None)
+    return slice(arr_min, arr_max + 1)
 
 
 def _create_colorlist_classnames(arr=None, ds_name='pavia_centre'):
-	"""Return correct colormap and class names for plotting."""
-	if ds_name == 'pavia_centre':
-		color_list = ('white', 'blue', 'green', 'olive', 'red',
-              'yellow', 'grey', 'cyan', 'orange', 'black')
-		class_names = ('No Data', 'Water', 'Trees', 'Meadows', 'Self-Blocking Bricks',
-			'Bare Soil', 'Asphalt', 'Bitumen', 'Tiles', 'Shadows')
-
-	elif ds_name == 'krkonose':
-		color_list = ('white', 'red', 'green', 'yellow', 'orange', 'pink',
-            'blue', 'cyan', 'black', 'grey')
-		class_names = ('No Data', 'metlička křivolaká',
-            'metlička, tomka a ostřice',
-            'brusnice borůvková', 'metlice trsnatá',
-            'borovice kleč', 'smilka tuhá', 'kamenná moře bez vegetace',
-            'vřes obecný', 'kameny, půda, mechy a vegetace')
-	else:
-		print('Incorrect dataset name for creating a plot. Cannot create a colormap and a list of class names.')
-
-	if not arr.any():
-		return color_list, class_names
-
-	elif arr.any():
-		arr_min, arr_max = np.min(arr), np.max(arr)
-		out_cmap = color_list[arr_min:arr_max]
-		out_class_names = class_names[arr_min:arr_max]
-		return out_cmap, out_class_names
-
-
-def _image_show(raster, title='Natural color composite'):
+    """Return correct colormap and class names for plotting."""
+    if ds_name not in _COLOR_LISTS:
+        print('Incorrect dataset name for creating a plot. Cannot create a colormap and a list of class names.')
+    classes = _class_range(arr)
+    return _COLOR_LISTS[ds_name][classes], _CLASS_NAMES[ds_name][classes]
+
+
+@njit(parallel=True, cache=True)
+def _apply_lut(raster, lut, out):
+    """Write the colour of each class value, clipped to the table, to out."""
+    last = lut.shape[0] - 1
+    for i in prange(raster.size):
+        out[i] = lut[min(max(raster[i], 0), last)]
+
+
+def _read_curve_4d(imagery, reference, tile_num):
+    """Return the spectral curve and label of a tile of shape (1, 1, bands)."""
+    return imagery[tile_num, 0, 0, :], reference[tile_num, 0, 0, 0] + 1
+
+
+def _read_curve_3d(imagery, reference, tile_num):
+    """Return the spectral curve and label of a tile of shape (1, bands)."""
+    return imagery[tile_num, 0, :], reference[tile_num] + 1
+
+
+# Spectral curve readers by the number of dimensions of the imagery
+_CURVE_READERS = {4: _read_curve_4d, 3: _read_curve_3d}
+
+
+def _get_axes(ncols, figsize, reuse=False):
+    """Return a row of axes, with reuse taking the open figure of the layout."""
+    if not reuse:
+        fig, axes = plt.subplots(1, ncols, figsize=figsize, squeeze=False)
+        return fig, axes[0]
+    key = (ncols, tuple(figsize))
+    fig, axes = _FIGURES.get(key, (None, None))
+    # Numbers of closed figures are reused, so check it is still the same one
+    if fig is None or not plt.fignum_exists(fig.number) \
+            or plt.figure(fig.number) is not fig:
+        fig, axes = plt.subplots(1, ncols, figsize=figsize, squeeze=False)
+        axes = axes[0]
+        _FIGURES[key] = fig, axes
+    return fig, axes
+
+
+def _draw_image(ax, data, **kwargs):
+    """Update the image already shown in the axes or create a new one."""
+    images = ax.get_images()
+    if images and images[0].get_array().shape == data.shape:
+        images[0].set_data(data)
+        images[0].set(**kwargs)
+        images[0].autoscale()
+        return images[0]
+    for image in images:
+        image.remove()
+    return ax.imshow(data, **kwargs)
+
+
+def _to_rgb8(raster, gain=1):
+    """Scale a raster to an 8-bit composite, 3000 * gain being the maximum."""
+    rgb = np.multiply(raster, gain * 255 / 3000, dtype=np.float32)
+    np.clip(rgb, 0, 255, out=rgb)
+    return rgb.astype(np.uint8)
+
+
+def _decimation_step(raster, ax):
+    """Return how many raster columns fall on one pixel of the axes."""
+    width = max(int(ax.get_window_extent().width), 1)
+    return max(raster.shape[1] // width, 1)
+
+
+def _mean_pool(raster, step):
+    """Average the raster over blocks of step x step pixels."""
+    height = raster.shape[0] // step * step
+    width = raster.shape[1] // step * step
+    blocks = raster[:height, :width].reshape(
+        height // step, step, width // step, step, -1)
+    return blocks.mean(axis=(1, 3), dtype=np.float32).astype(raster.dtype)
+
+
+def _band_composite(img, gain=1, bands=(25, 15, 5)):
+    """
+    Return an 8-bit RGB view of an image of shape (bands, height, width).
+
+    The bands are gathered and scaled in buffers reused between the calls,
+    imshow copies the data it is given.
+    """
+    shape = (3,) + img.shape[1:]
+    if shape not in _COMPOSITE_BUFFERS:
+        _COMPOSITE_BUFFERS[shape] = (np.empty(shape, np.float32),
+                                     np.empty(shape, np.uint8))
+    rgb, rgb8 = _COMPOSITE_BUFFERS[shape]
+    for i, band in enumerate(bands):
+        rgb[i] = img[band]
+    np.multiply(rgb, gain * 255 / 3000, out=rgb)
+    np.clip(rgb, 0, 255, out=rgb)
+    np.copyto(rgb8, rgb, casting='unsafe')
+    return rgb8.transpose(1, 2, 0)
+
+
+def _composite(raster, ax, gain=1, full_res=False, scaled=False):
+    """
+    Return the 8-bit composite of a raster as it is drawn in the axes.
+
+    scaled marks a raster that already is an 8-bit composite.
+    """
+    if not full_res:
+        step = _decimation_step(raster, ax)
+        if step > 1:
+            raster = _mean_pool(raster, step)
+    if scaled:
+        return raster
+    return _to_rgb8(raster, gain)
+
+
+def _class_colors(raster, ds_name, ax, full_res=False):
+    """Return the RGBA image of a classification as it is drawn in the axes."""
+    raster = _squeeze_classes(raster)
+    if not full_res:
+        step = _decimation_step(raster, ax)
+        raster = raster[::step, ::step]
+    values = np.ravel(raster)
+    # Numba promotes 64-bit unsigned values to floats when clamping them
+    if values.dtype.kind not in 'iu' or values.dtype.itemsize > 4:
+        values = values.astype(np.intp)
+    rgba = np.empty(raster.shape + (4,), np.uint8)
+    with _NUMBA_LOCK:
+        _apply_lut(values, _LUTS[ds_name], rgba.reshape(-1, 4))
+    return rgba
+
+
+def _image_show(raster, title='Natural color composite', ax=None, gain=1,
+                full_res=False, scaled=False):
     """Show a figure based on a hyperspectral raster."""
-    plt.imshow(raster/3000)
-    plt.title(title)
-    plt.axis('off')
+    ax = ax or plt.gca()
+    _draw_image(ax, _composite(raster, ax, gain, full_res, scaled),
+                interpolation='nearest', rasterized=True)
+    ax.set_title(title)
+    ax.set_axis_off()
+
+
+def _class_show(raster, title, ds_name='pavia_centre', ax=None,
+                full_res=False):
+    """Show a figure based on a classification, return its legend handles."""
+    ax = ax or plt.gca()
+    _draw_image(ax, _class_colors(raster, ds_name, ax, full_res),
+                interpolation='nearest', rasterized=True)
+    # plt.colorbar(ticks=(np.linspace(0.5, 8.5, 10)))
+    ax.set_title(title)
+    ax.set_axis_off()
+    return _LEGEND_HANDLES[ds_name][_class_range(raster)]
 
 
-def _class_show(raster, title, ds_name='pavia_centre'):
-    """Show a figure based on a classification."""
-    colorlist, classnames = _create_colorlist_classnames(raster, ds_name=ds_name)
-    for label, color in zip(classnames, colorlist):
-        plt.plot(0, 0, 's', label=label, alpha=1,
-                 color=color, markeredgecolor='black')
+def show_img_ref(hs_img, gt_img, ds_name='pavia_centre', full_res=False,
+                 reuse=False):
+    """
+    Show the hyperspectral image and a training reference.
 
-    plt.imshow(raster, cmap=ListedColormap(colorlist), interpolation='nearest')
-    # plt.colorbar(ticks=(np.linspace(0.5, 8.5, 10)))
-    plt.title(title)
-    plt.axis('off')
-    # plt.legend()
+    Rasters larger than the figure are decimated to its resolution, unless
+    full_res is set.
+
+    With reuse set, the figure of the previous call is drawn over while it
+    is still open, instead of creating a new one.
+    """
+    _, axes = _get_axes(2, figsize=[16, 8], reuse=reuse)
+    _image_show(hs_img, ax=axes[0], full_res=full_res)
+    handles = _class_show(gt_img, 'Reference data', ds_name=ds_name,
+                          ax=axes[1], full_res=full_res)
+    axes[1].legend(handles=handles, ncol=3, bbox_to_anchor=(0.5, -0.15),
+                   loc='lower center')
 
 
-def show_img_ref(hs_img, gt_img, ds_name='pavia_centre'):
-    """Show the hyperspectral image and a training reference."""
-    plt.figure(figsize=[16, 8])
-    plt.subplot(1, 2, 1)
-    _image_show(hs_img)
-    plt.subplot(1, 2, 2)
-    _class_show(gt_img, 'Reference data', ds_name=ds_name)
-    plt.legend(ncol=3, bbox_to_anchor=(0.5, -0.15), loc='lower center')
+@lru_cache(maxsize=8)
+def _wavelengths(wl_min, wl_max, nbands):
+    """Return a read-only vector of evenly spaced wavelengths."""
+    x = np.linspace(wl_min, wl_max, nbands)
+    x.flags.writeable = False
+    return x
 
 
 def show_spectral_curve(tile_dict, tile_num, ds_name='pavia_centre',
-                        title='Spectral curve for pixel #'):
+                        title='Spectral curve for pixel #', ax=None):
     """Show a figure of the spectral curve."""
+    ax = ax or plt.gca()
     # Choose a range of collected wavelengths
     if ds_name == 'lucni_hora':
         wl_min, wl_max = 404, 997
-        plt.xlabel('Wavelength [nm]')
+        ax.set_xlabel('Wavelength [nm]')
     else:
         wl_min, wl_max = 1, tile_dict["imagery"].shape[-1] + 1
-        plt.xlabel('Band number')
+        ax.set_xlabel('Band number')
     # Create a vector of wavelength values
-    x = np.linspace(wl_min, wl_max, tile_dict["imagery"].shape[-1])
+    x = _wavelengths(wl_min, wl_max, tile_dict["imagery"].shape[-1])
 
     # Read the spectral curve
-    if len(tile_dict["imagery"].shape) == 4:
-        y = tile_dict["imagery"][tile_num, 0, 0, :]
-        lbl = tile_dict["reference"][tile_num, 0, 0, :][0] + 1
-    elif len(tile_dict["imagery"].shape) == 3:
-        y = tile_dict["imagery"][tile_num, 0, :]
-        lbl = tile_dict["reference"][tile_num] + 1
-    else:
+    imagery = np.asarray(tile_dict["imagery"])
+    read_curve = _CURVE_READERS.get(imagery.ndim)
+    if read_curve is None:
         print('The input data is in an incompatible shape.')
+        return
+    y, lbl = read_curve(imagery, np.asarray(tile_dict["reference"]), tile_num)
 
     _, classnames = _create_colorlist_classnames(ds_name=ds_name)
-    plt.plot(x, y, label=f'{classnames[lbl]}')
-    plt.title(f'{title} {tile_num}')
-    plt.legend(bbox_to_anchor=(0.5, 0.89), loc='lower center')
+    ax.plot(x, y, label=f'{classnames[lbl]}')
+    ax.set_title(f'{title} {tile_num}')
+    ax.legend(bbox_to_anchor=(0.5, 0.89), loc='lower center')
 
 
 def show_augment_spectral(tile_dict, tile_num, aug_funct):
     """Show a figure of the original spectal curve and the augmented curve."""
-    plt.figure(figsize=[8, 4])
-    plt.subplot(1, 2, 1)
+    _, axes = plt.subplots(1, 2, figsize=[8, 4], squeeze=False)
     show_spectral_curve(tile_dict, tile_num,
-                        title='Original spectral curve for pixel #')
-    plt.subplot(1, 2, 2)
-    tensor_obs = torch.from_numpy(tile_dict["imagery"])
-    tensor_gt = torch.from_numpy(tile_dict["reference"])
+                        title='Original spectral curve for pixel #',
+                        ax=axes[0, 0])
+    # Augment only the displayed pixel instead of the whole dataset
+    pixel = slice(tile_num, tile_num + 1)
+    tensor_obs = torch.from_numpy(
+        np.ascontiguousarray(tile_dict["imagery"][pixel]))
+    tensor_gt = torch.from_numpy(
+        np.ascontiguousarray(tile_dict["reference"][pixel]))
     aug_obs, aug_gt = aug_funct(tensor_obs, tensor_gt)
     aug_dict = {'imagery': aug_obs, 'reference': aug_gt}
-    show_spectral_curve(aug_dict, tile_num,
-                        title='Augmented spectral curve for pixel #')
+    show_spectral_curve(aug_dict, 0, ax=axes[0, 1])
+    axes[0, 1].set_title(f'Augmented spectral curve for pixel # {tile_num}')
+
+
+def show_augment_spatial(tile_dict, tile_num, aug_funct, ds_name = 'pavia_centre',
+                         preview_bands=None, reuse=False, full_res=False):
+    """
+    Show a figure of the original and the augmented RGB composite.
 
+    Rasters larger than the figure are decimated to its resolution, unless
+    full_res is set.
 
-def show_augment_spatial(tile_dict, tile_num, aug_funct, ds_name = 'pavia_centre'):
-    """Show a figure of the original and the augmented RGB composite."""
-    img_rgb = tile_dict['imagery'][tile_num, [25, 15, 5], :, :]
-    img_rgb_transposed = img_rgb.transpose((1, 2, 0))
+    If aug_funct does not depend on the number of bands, preview_bands can
+    name the three bands of the composite, so only they are augmented.
+
+    With reuse set, the figure of the previous call is drawn over while it
+    is still open, instead of creating a new one.
+    """
+    img_rgb = _band_composite(tile_dict['imagery'][tile_num, :, :, :],
+                              gain=20000, bands=preview_bands or (25, 15, 5))
     tile_gt = tile_dict['reference'][tile_num, :, :]
-    plt.figure(figsize=[20, 5])
+    _, axes = _get_axes(4, figsize=[20, 5], reuse=reuse)
 
-    plt.subplot(1, 4, 1)
-    _image_show(img_rgb_transposed*20000, title='Original RGB composite')
+    _image_show(img_rgb, title='Original RGB composite', ax=axes[0],
+                scaled=True, full_res=full_res)
 
-    plt.subplot(1, 4, 2)
     img_hs = tile_dict['imagery'][tile_num, :, :, :]
+    aug_bands = (25, 15, 5)
+    if preview_bands is not None:
+        img_hs = img_hs[list(preview_bands)]
+        aug_bands = (0, 1, 2)
     img_augmented, gt_augmented = aug_funct(torch.from_numpy(img_hs),
-                                 torch.from_numpy(tile_gt[None, :, :]))
+                                 torch.as_tensor(tile_gt).unsqueeze(0))
     print(img_augmented.shape)
-    img_augmented_np = np.array(img_augmented)
-    img_aug_trans = img_augmented_np[0, [25, 15, 5], :, :].transpose(1, 2, 0)
-
-    _image_show(np.array(img_aug_trans)*20000, title='Augmented RGB composite')
-
-    plt.subplot(1, 4, 3)
-    _class_show(tile_gt, 'Original reference data', ds_name=ds_name)
-    plt.legend(ncol=3, bbox_to_anchor=(0.5, -0.15), loc='lower center')
-
-    plt.subplot(1, 4, 4)
-    _class_show(np.array(gt_augmented[0,:,:]), 'Augmented reference data', ds_name=ds_name)
-
-def show_augment_spectro_spatial(tile_dict, tile_num, aug_funct, ds_name = 'pavia_centre'):
-    """Show a figure of the original and the augmented RGB composite."""
-    img_rgb = tile_dict['imagery'][tile_num, 0, [25, 15, 5], :, :]
-    img_rgb_transposed = img_rgb.transpose((1, 2, 0))
+    img_aug_rgb = _band_composite(img_augmented.detach()[0].numpy(),
+                                  gain=20000, bands=aug_bands)
+
+    _image_show(img_aug_rgb, title='Augmented RGB composite', ax=axes[1],
+                scaled=True, full_res=full_res)
+
+    handles = _class_show(tile_gt, 'Original reference data',
+                          ds_name=ds_name, ax=axes[2],
+                          full_res=full_res)
+    axes[2].legend(handles=handles, ncol=3, bbox_to_anchor=(0.5, -0.15),
+                   loc='lower center')
+
+    gt_aug = gt_augmented.detach()[0, :, :].numpy()
+    _class_show(gt_aug, 'Augmented reference data', ds_name=ds_name,
+                ax=axes[3], full_res=full_res)
+
+def show_augment_spectro_spatial(tile_dict, tile_num, aug_funct, ds_name = 'pavia_centre',
+                                 reuse=False, full_res=False):
+    """
+    Show a figure of the original and the augmented RGB composite.
+
+    Rasters larger than the figure are decimated to its resolution, unless
+    full_res is set.
+
+    With reuse set, the figure of the previous call is drawn over while it
+    is still open, instead of creating a new one.
+    """
+    img_rgb = _band_composite(tile_dict['imagery'][tile_num, 0, :, :, :],
+                              gain=20000)
     tile_gt = tile_dict['reference'][tile_num, :, :]
-    plt.figure(figsize=[20, 5])
+    _, axes = _get_axes(4, figsize=[20, 5], reuse=reuse)
 
-    plt.subplot(1, 4, 1)
-    _image_show(img_rgb_transposed*20000, title='Original RGB composite')
+    _image_show(img_rgb, title='Original RGB composite', ax=axes[0],
+                scaled=True, full_res=full_res)
 
-    plt.subplot(1, 4, 2)
     img_hs = tile_dict['imagery'][tile_num, 0, :, :, :]
     img_augmented, gt_augmented = aug_funct(torch.from_numpy(img_hs),
-                                 torch.from_numpy(tile_gt[None, :, :]))
+                                 torch.as_tensor(tile_gt).unsqueeze(0))
     print(img_augmented.shape)
-    img_augmented_np = np.array(img_augmented)
-    img_aug_trans = img_augmented_np[0, 0, [25, 15, 5], :, :].transpose(1, 2, 0)
+    img_aug_rgb = _band_composite(img_augmented.detach()[0, 0].numpy(),
+                                  gain=20000)
 
-    _image_show(np.array(img_aug_trans)*20000, title='Augmented RGB composite')
+    _image_show(img_aug_rgb, title='Augmented RGB composite', ax=axes[1],
+                scaled=True, full_res=full_res)
 
-    plt.subplot(1, 4, 3)
-    _class_show(tile_gt, 'Original reference data', ds_name=ds_name)
-    plt.legend(ncol=3)
+    handles = _class_show(tile_gt, 'Original reference data',
+                          ds_name=ds_name, ax=axes[2],
+                          full_res=full_res)
+    axes[2].legend(handles=handles, ncol=3)
 
-    plt.subplot(1, 4, 4)
-    _class_show(np.array(gt_augmented[0,:,:]), 'Augmented reference data',
-		ds_name=ds_name)
+    gt_aug = gt_augmented.detach()[0, :, :].numpy()
+    _class_show(gt_aug, 'Augmented reference data',
+		ds_name=ds_name, ax=axes[3], full_res=full_res)
 
 
-def show_classified(hs_img, gt_img, class_img, ds_name='pavia_centre'):
-    """Compare the classification result to the reference data."""
-    plt.figure(figsize=[15, 5])
-    plt.subplot(1, 3, 1)
-    _image_show(hs_img)
+def _draw_classified(axes, hs_img, gt_img, class_img, ds_name,
+                     full_res=False):
+    """Draw the classification comparison into a row of three axes."""
+    _image_show(hs_img, ax=axes[0], full_res=full_res)
 
-    plt.subplot(1, 3, 2)
-    _class_show(gt_img, 'Reference data', ds_name=ds_name)
-    plt.legend(ncol=3)
+    handles = _class_show(gt_img, 'Reference data', ds_name=ds_name,
+                          ax=axes[1], full_res=full_res)
+    axes[1].legend(handles=handles, ncol=3)
 
-    plt.subplot(1, 3, 3)
     _class_show(class_img, 'Classified data',
-        ds_name=ds_name)
+        ds_name=ds_name, ax=axes[2], full_res=full_res)
+
+
+def show_classified(hs_img, gt_img, class_img, ds_name='pavia_centre',
+                    full_res=False, reuse=False):
+    """
+    Compare the classification result to the reference data.
+
+    Rasters larger than the figure are decimated to its resolution, unless
+    full_res is set.
+
+    With reuse set, the figure of the previous call is drawn over while it
+    is still open, instead of creating a new one.
+    """
+    _, axes = _get_axes(3, figsize=[15, 5], reuse=reuse)
+    _draw_classified(axes, hs_img, gt_img, class_img, ds_name, full_res)
+
+
+class Classified_viewer:
+    """Update the classification comparison in place using blitting."""
+
+    def __init__(self, ds_name='pavia_centre', full_res=False):
+        """
+        Initialize the class with required data.
+
+        ds_name:    str, name of the dataset selecting the class colours
+        full_res:   bool, draw the rasters without decimation
+
+        Only the images are redrawn by update, so the rasters have to keep
+        their shape. Blitting needs an interactive backend.
+        """
+        self.ds_name = ds_name
+        self.full_res = full_res
+        self.fig = None
+
+    def update(self, hs_img, gt_img, class_img):
+        """Show new rasters, redrawing only the images after the first call."""
+        if self.fig is None:
+            self._create_figure(hs_img, gt_img, class_img)
+            return
+
+        arrays = (_composite(hs_img, self.axes[0], full_res=self.full_res),
+                  _class_colors(gt_img, self.ds_name, self.axes[1],
+                                self.full_res),
+                  _class_colors(class_img, self.ds_name, self.axes[2],
+                                self.full_res))
+        canvas = self.fig.canvas
+        for ax, image, background, arr in zip(self.axes, self.images,
+                                              self.backgrounds, arrays):
+            canvas.restore_region(background)
+            image.set_data(arr)
+            self._draw_animated(ax, image)
+            canvas.blit(ax.bbox)
+        canvas.flush_events()
+
+    def _create_figure(self, hs_img, gt_img, class_img):
+        """Draw the figure and cache the backgrounds of the images."""
+        self.fig, axes = plt.subplots(1, 3, figsize=[15, 5], squeeze=False)
+        self.axes = axes[0]
+        _draw_classified(self.axes, hs_img, gt_img, class_img, self.ds_name,
+                         self.full_res)
+        self.images = [ax.get_images()[0] for ax in self.axes]
+        for image in self.images:
+            image.set_animated(True)
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.fig.canvas.draw()
+        self.fig.canvas.blit(self.fig.bbox)
+
+    def _on_draw(self, event):
+        """Cache the backgrounds after a full redraw, then draw the images."""
+        canvas = event.canvas
+        # Saving to a vector format draws on a canvas without blitting
+        if not canvas.supports_blit:
+            return
+        self.backgrounds = [canvas.copy_from_bbox(ax.bbox)
+                            for ax in self.axes]
+        for ax, image in zip(self.axes, self.images):
+            self._draw_animated(ax, image)
+
+    @staticmethod
+    def _draw_animated(ax, image):
+        """Draw the image and the legend covering it."""
+        ax.draw_artist(image)
+        if ax.get_legend() is not None:
+            ax.draw_artist(ax.get_legend())
+
+
+def _render_worker():
+    """Render the queued comparisons without using pyplot."""
+    while True:
+        hs_img, gt_img, class_img, out_path, ds_name, full_res = \
+            _RENDER_QUEUE.get()
+        try:
+            fig = Figure(figsize=[15, 5])
+            FigureCanvasAgg(fig)
+            axes = fig.subplots(1, 3, squeeze=False)[0]
+            _draw_classified(axes, hs_img, gt_img, class_img,
+                             ds_name, full_res)
+            if out_path:
+                fig.savefig(out_path)
+            png = io.BytesIO()
+            fig.savefig(png, format='png')
+            _RENDERED.put(png.getvalue())
+        except Exception as err:
+            print(f'Rendering of the classification comparison failed: {err}')
+        finally:
+            _RENDER_QUEUE.task_done()
+
+
+def show_classified_async(hs_img, gt_img, class_img, out_path=None,
+                          ds_name='pavia_centre', full_res=False):
+    """
+    Queue the classification comparison for rendering in the background.
+
+    The call returns immediately, the figure is optionally saved to out_path
+    and can be displayed later with display_rendered.
+
+    Rasters larger than the figure are decimated to its resolution, unless
+    full_res is set.
+    """
+    global _RENDER_THREAD
+    if _RENDER_THREAD is None:
+        _RENDER_THREAD = threading.Thread(target=_render_worker, daemon=True)
+        _RENDER_THREAD.start()
+    # Copy the data, so the worker does not share buffers with the caller
+    _RENDER_QUEUE.put_nowait((np.array(hs_img, dtype=np.float32),
+                              np.array(gt_img), np.array(class_img),
+                              out_path, ds_name, full_res))
+
+
+def display_rendered(wait=False):
+    """Display the comparisons rendered in the background so far."""
+    from IPython.display import Image, display
+    if wait:
+        _RENDER_QUEUE.join()
+    while True:
+        try:
+            png = _RENDERED.get_nowait()
+        except queue.Empty:
+            break
+        display(Image(data=png))
 
 
 def sec_to_hms(sec):
     """Convert seconds to hours, minutes, seconds."""
-    ty_res = gmtime(sec)
-    res = strftime("%Hh, %Mm, %Ss", ty_res)
-    return str(res)
+    hours, rest = divmod(int(sec), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{hours:02d}h, {minutes:02d}m, {seconds:02d}s'